@@ -1,47 +1,81 @@
 # extractor.py
 import os
+import queue
+import shutil
+import tempfile
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from s3transfer.subscribers import BaseSubscriber
 
-def download_and_unzip_all_trades(symbol, output_dir, bucket_name, s3_client):
+# Number of concurrent S3 requests (listings and archive downloads)
+S3_CONCURRENCY = int(os.environ.get("S3_CONCURRENCY", "16"))
+
+# A single transfer manager schedules every archive GET or upload PUT (and the parts of large files,
+# transferred as concurrent 16MB parts in 1MB chunks) on one shared request pool, the way the AWS CLI
+# does. The S3 client needs at least max_concurrency pooled connections.
+TRANSFER_MANAGER_CFG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=4 * S3_CONCURRENCY,
+    io_chunksize=1024 * 1024,
+    use_threads=True,
+)
+
+# Number of threads unzipping archives
+UNZIP_WORKERS = os.cpu_count() or 1
+
+# Maximum number of downloaded archives waiting to be unzipped; enough to keep every unzip thread busy
+UNZIP_QUEUE_SIZE = 2 * UNZIP_WORKERS
+
+# Upper bound on archive bytes held in RAM at once. An archive can be in memory while it downloads
+# (one per downloader), while it waits in the queue, and while it is unzipped (one per unzip thread),
+# so each of those slots gets an equal share; anything larger spills to a temporary file on disk.
+# Worst case resident archive data is therefore ARCHIVE_MEMORY_BUDGET (256MB by default).
+ARCHIVE_MEMORY_BUDGET = int(os.environ.get("ARCHIVE_MEMORY_BUDGET", str(256 << 20)))
+ARCHIVE_MEMORY_SLOTS = S3_CONCURRENCY + UNZIP_QUEUE_SIZE + UNZIP_WORKERS
+
+# Archives up to this size are held in memory while they are unzipped
+SPOOL_MAX_SIZE = ARCHIVE_MEMORY_BUDGET // ARCHIVE_MEMORY_SLOTS
+
+# Written into each scenario folder after a successful unzip; records which archive version it holds
+ARCHIVE_MARKER = ".archive-etag"
+
+# Archives that inflate to more than this have their members extracted in parallel
+PARALLEL_UNZIP_MIN_SIZE = 256 << 20
+
+
+def download_and_unzip_all_trades(symbol, output_dir, bucket_name, s3_client, on_scenario_ready=None):
     """
     Downloads all the trade archives (ZIP files) for the specified symbol from the given S3 bucket.
-    For each archive, it saves the ZIP file to an archive directory and unzips it into its own subdirectory under 'trades'.
+    Each archive is streamed into memory (spilling to a temporary file only when it is larger than
+    SPOOL_MAX_SIZE) and unzipped straight into its own subdirectory under 'trades'.
+
+    The sync is incremental: a scenario folder whose recorded ETag and size still match the S3 object
+    is left alone, and folders for archives that no longer exist in S3 are removed.
 
     :param s3_client: The boto3 S3 client object.
     :param symbol: The symbol name (e.g. "btc-1mF")
     :param output_dir: The base output directory where archives and extracted files will be saved.
     :param bucket_name: The S3 bucket containing the archives.
+    :param on_scenario_ready: Optional callback, called with a scenario folder as soon as it has been
+                              unzipped (from an unzip thread), so callers can start on it early.
     """
 
 
-    # Directly list all objects in the bucket
-    response = s3_client.list_objects_v2(Bucket=bucket_name)
-
-    # Filter for keys that contain the symbol in the path
-    if "Contents" in response:
-        filtered_contents = []
-        for obj in response["Contents"]:
-            key = obj["Key"]
-            # Check if the key contains the symbol
-            if f"/{symbol}/" in key:
-                filtered_contents.append(obj)
+    contents = _list_symbol_objects(s3_client, bucket_name, symbol)
+    trades_dir = os.path.join(output_dir, "trades")
 
-        if filtered_contents:
-            response = {"Contents": filtered_contents}
-        else:
-            response = {}
-
-    if "Contents" not in response:
+    if not contents:
         print(f"No files found under symbol: {symbol}")
+        _remove_stale_scenarios(trades_dir, set())
         return
 
-    # Create archive base directory for trades
-    archives_dir = os.path.join(output_dir, "archives", "trades")
-    os.makedirs(archives_dir, exist_ok=True)
-
-    # Process each ZIP file
-    for obj in response["Contents"]:
+    # Work out where every archive goes up front (pure path math, no IO)
+    tasks = []
+    for obj in contents:
         key = obj["Key"]
         if not key.endswith(".zip"):
             continue
@@ -57,19 +91,184 @@ def download_and_unzip_all_trades(symbol, output_dir, bucket_name, s3_client):
         # Create the new scenario format: backTestId___scenario_params
         scenario = f"{back_test_id_from_key}___{scenario_params}" if back_test_id_from_key and back_test_id_from_key != symbol else scenario_params
 
-        local_zip_file = os.path.join(archives_dir, f"{scenario}.zip")
+        # Define output destination for extracted trade files into a scenario-specific folder
+        destination_folder = os.path.join(trades_dir, scenario)
 
-        print(f"Downloading s3://{bucket_name}/{key} to {local_zip_file} ...")
-        s3_client.download_file(bucket_name, key, local_zip_file)
+        # Identifies this version of the archive; unchanged archives are not downloaded again
+        archive_version = f"{obj.get('ETag', '')} {obj.get('Size', '')}"
 
-        # Define output destination for extracted trade files into a scenario-specific folder
-        destination_folder = os.path.join(output_dir, "trades", scenario)
-        os.makedirs(destination_folder, exist_ok=True)
+        tasks.append((key, obj.get("Size"), scenario, destination_folder, archive_version))
 
-        print(f"Unzipping {local_zip_file} to {destination_folder} ...")
-        with zipfile.ZipFile(local_zip_file, "r") as zf:
-            zf.extractall(destination_folder)
+    _remove_stale_scenarios(trades_dir, {task[2] for task in tasks})
+
+    changed_tasks = [task for task in tasks if _read_archive_marker(task[3]) != task[4]]
+    print(f"{len(tasks) - len(changed_tasks)} of {len(tasks)} archives are unchanged and will be skipped.")
+
+    # Downloads are network bound and unzipping is CPU bound, so they run as a two-stage pipeline:
+    # downloader threads push finished archives onto a bounded queue that unzip threads drain.
+    # The bound stops downloads racing ahead and holding too many archives in memory.
+    download_queue = queue.Queue()
+    for task in changed_tasks:
+        download_queue.put(task)
+    unzip_queue = queue.Queue(maxsize=UNZIP_QUEUE_SIZE)
+    errors = []
+
+    def download_worker():
+        while True:
+            try:
+                key, size, scenario, destination_folder, archive_version = download_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                archive = _download_archive(transfer_manager, bucket_name, key, size)
+            except Exception as e:
+                print(f"Error downloading s3://{bucket_name}/{key}: {e}")
+                errors.append(e)
+                continue
+            unzip_queue.put((scenario, archive, destination_folder, archive_version))
+
+    def unzip_worker():
+        while True:
+            item = unzip_queue.get()
+            if item is None:
+                return
+            try:
+                _unzip_archive(*item)
+            except Exception as e:
+                print(f"Error unzipping scenario {item[0]}: {e}")
+                errors.append(e)
+                continue
+            if on_scenario_ready is not None:
+                on_scenario_ready(item[2])
 
-        print(f"Done processing scenario: {scenario}")
+    with create_transfer_manager(s3_client, TRANSFER_MANAGER_CFG) as transfer_manager:
+        downloaders = [threading.Thread(target=download_worker) for _ in range(min(S3_CONCURRENCY, len(changed_tasks)))]
+        unzippers = [threading.Thread(target=unzip_worker) for _ in range(UNZIP_WORKERS)]
+        for thread in downloaders + unzippers:
+            thread.start()
+
+        for thread in downloaders:
+            thread.join()
+        # One sentinel per unzip thread once every archive has been queued
+        for _ in unzippers:
+            unzip_queue.put(None)
+        for thread in unzippers:
+            thread.join()
+
+    if errors:
+        raise errors[0]
 
     print("Done downloading and unzipping all scenarios.")
+
+
+def _read_archive_marker(destination_folder):
+    """Return the archive version recorded in a scenario folder, or None if there isn't one."""
+    try:
+        with open(os.path.join(destination_folder, ARCHIVE_MARKER)) as marker:
+            return marker.read()
+    except FileNotFoundError:
+        return None
+
+
+def _remove_stale_scenarios(trades_dir, scenarios):
+    """Delete scenario folders under trades_dir whose archive is no longer in S3."""
+    if not os.path.isdir(trades_dir):
+        return
+
+    for entry in os.scandir(trades_dir):
+        if entry.name not in scenarios:
+            print(f"Removing stale scenario: {entry.path}")
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+
+
+def _list_symbol_objects(s3_client, bucket_name, symbol):
+    """
+    Lists every object stored under <backTestId>/<symbol>/ in the bucket.
+
+    The top-level backTestId prefixes are discovered first with a delimited listing, then each
+    <backTestId>/<symbol>/ prefix is paginated concurrently so S3 only returns matching keys and
+    listings larger than 1000 keys are not truncated.
+
+    :return: The list of object summaries (dicts with Key, Size, ...) for the symbol.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+
+    back_test_prefixes = []
+    for page in paginator.paginate(Bucket=bucket_name, Delimiter="/"):
+        back_test_prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+
+    def list_prefix(prefix):
+        objects = []
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            objects.extend(page.get("Contents", []))
+        return objects
+
+    with ThreadPoolExecutor(max_workers=S3_CONCURRENCY) as executor:
+        listings = executor.map(list_prefix, [f"{prefix}{symbol}/" for prefix in back_test_prefixes])
+        return [obj for objects in listings for obj in objects]
+
+
+class _ProvideSizeSubscriber(BaseSubscriber):
+    """Gives s3transfer the object size from the listing so it does not send a HeadObject first."""
+
+    def __init__(self, size):
+        super().__init__()
+        self._size = size
+
+    def on_queued(self, future, **kwargs):
+        future.meta.provide_transfer_size(self._size)
+
+
+def _download_archive(transfer_manager, bucket_name, key, size):
+    """Download a single trade archive from S3 into a spooled temporary file and return it."""
+    print(f"Downloading s3://{bucket_name}/{key} ...")
+    archive = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    subscribers = [_ProvideSizeSubscriber(size)] if size is not None else None
+    try:
+        transfer_manager.download(bucket_name, key, archive, subscribers=subscribers).result()
+    except Exception:
+        archive.close()
+        raise
+    archive.seek(0)
+    return archive
+
+
+def _unzip_archive(scenario, archive, destination_folder, archive_version):
+    """Unzip a downloaded trade archive into a fresh scenario folder, record its version and release it."""
+    # Clear out anything left from an older version of this archive
+    if os.path.exists(destination_folder):
+        shutil.rmtree(destination_folder)
+    os.makedirs(destination_folder, exist_ok=True)
+
+    print(f"Unzipping {scenario} to {destination_folder} ...")
+    with archive, zipfile.ZipFile(archive, "r") as zf:
+        members = zf.infolist()
+        if len(members) < 2 or sum(member.file_size for member in members) < PARALLEL_UNZIP_MIN_SIZE:
+            zf.extractall(destination_folder)
+        else:
+            _extract_members_in_parallel(zf, members, destination_folder)
+
+    # Only written once extraction succeeded, so a partial unzip is retried on the next run
+    with open(os.path.join(destination_folder, ARCHIVE_MARKER), "w") as marker:
+        marker.write(archive_version)
+
+    print(f"Done processing scenario: {scenario}")
+
+
+def _extract_members_in_parallel(zf, members, destination_folder):
+    """
+    Extracts the members of one large archive concurrently. zlib releases the GIL while inflating,
+    so several members decompress on different cores at once.
+    """
+    # Create the directory tree up front so concurrent extracts don't race on makedirs
+    for member in members:
+        parts = [part for part in member.filename.split("/")[:-1] if part not in ("", ".", "..")]
+        if parts:
+            os.makedirs(os.path.join(destination_folder, *parts), exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as member_pool:
+        for future in [member_pool.submit(zf.extract, member, destination_folder) for member in members]:
+            future.result()
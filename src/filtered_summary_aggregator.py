@@ -1,70 +1,151 @@
 # extractor.py (or any other Python module as needed)
+import csv
+import glob
 import os
-import pandas as pd
-import re
+from concurrent.futures import ThreadPoolExecutor
 
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 
-def aggregate_filtered_summary_files(base_output_dir, aggregated_file_path):
+
+def _scenario_from_dir(directory):
+    """
+    Extracts the scenario name from the directory a _filtered_summary.csv was found in.
+    The back_test_id will always be in downloaded keys.
+    The directory structure is: output/symbol/trades/backTestId___scenario_params
+    """
+    parts = directory.split(os.path.sep)
+    if len(parts) >= 4 and 'trades' in parts:
+        # Find the index of 'trades' in the path
+        trades_index = parts.index('trades')
+        # The scenario should be the part after 'trades'
+        if trades_index + 1 < len(parts):
+            return parts[trades_index + 1]
+    return "unknown_scenario"
+
+
+def _read_one(file_path, scenario):
+    """
+    Reads a single _filtered_summary.csv into an Arrow table and tags it with its scenario.
+
+    :param file_path: Path to the _filtered_summary.csv file.
+    :param scenario: The scenario the file belongs to.
+    :return: The table with a Scenario column added, or None if the file could not be read.
+    """
+    try:
+        # Every column is read as text, so values reach the aggregated CSV exactly as they were written
+        # (Arrow's writer would otherwise reformat them, e.g. 1.0 as 1) and no type inference is needed.
+        # The runner infers the types when it reads the aggregated file back.
+        with open(file_path, newline="", encoding="utf-8-sig") as f:
+            column_names = next(csv.reader(f), [])
+        convert_options = pacsv.ConvertOptions(column_types={name: pa.string() for name in column_names},
+                                               strings_can_be_null=True)
+        table = pacsv.read_csv(file_path, convert_options=convert_options)
+
+        # Files whose scores are not numbers cannot be sorted, so they are rejected here
+        if 'CompositeScore' in table.column_names:
+            pc.cast(table['CompositeScore'], pa.float64())
+
+        # Add scenario column to the table - handle both possible column names
+        scenario_column = pa.repeat(scenario, table.num_rows)
+        if 'TraderID' in table.column_names:
+            traderId_idx = table.column_names.index('TraderID')
+            table = table.add_column(traderId_idx + 1, 'Scenario', scenario_column)
+        elif 'traderId' in table.column_names:
+            traderId_idx = table.column_names.index('traderId')
+            table = table.add_column(traderId_idx + 1, 'Scenario', scenario_column)
+        else:
+            # If neither column exists, add the scenario as the first column
+            table = table.add_column(0, 'Scenario', scenario_column)
+
+        return table
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+        return None
+
+
+def read_filtered_summaries(directory):
+    """
+    Reads every _filtered_summary.csv under a directory (e.g. a scenario folder that has just been
+    unzipped), so files can be parsed while other archives are still downloading.
+
+    :param directory: The directory to search recursively.
+    :return: A dict mapping each file path to its table (None if it could not be read).
+    """
+    tables = {}
+    pattern = os.path.join(glob.escape(directory), "**", "*_filtered_summary.csv")
+    for file_path in glob.iglob(pattern, recursive=True):
+        tables[file_path] = _read_one(file_path, _scenario_from_dir(os.path.dirname(file_path)))
+    return tables
+
+
+def aggregate_filtered_summary_files(base_output_dir, aggregated_file_path, preloaded_tables=None, first_column=None):
     """
     Aggregates all files ending with _filtered_summary.csv under base_output_dir,
     sorts them by CompositeScore, and writes the aggregated data to aggregated_file_path.
+    Files are parsed concurrently with Arrow's CSV reader (which releases the GIL) and combined
+    as Arrow tables, so no intermediate pandas DataFrames are built.
 
     :param base_output_dir: The base output directory where _filtered_summary.csv files reside.
     :param aggregated_file_path: The output file path to write the aggregated CSV.
+    :param preloaded_tables: Optional dict of file path -> table from read_filtered_summaries; these
+                             files are not read again.
+    :param first_column: Optional column (e.g. "Scenario") to move to the front before writing.
     """
-    aggregated_df_list = []
-
-    # Recursively walk the directory tree and find all files ending with _filtered_summary.csv
-    for root, dirs, files in os.walk(base_output_dir):
-        for filename in files:
-            if filename.endswith("_filtered_summary.csv"):
-                file_path = os.path.join(root, filename)
-                print(f"Processing file: {file_path}")
-
-                try:
-                    df = pd.read_csv(file_path)
-
-                    # Extract the scenario from the directory path
-                    # The back_test_id will always be in downloaded keys
-                    # The directory structure is: output/symbol/trades/backTestId___scenario_params
-                    parts = root.split(os.path.sep)
-                    if len(parts) >= 4 and 'trades' in parts:
-                        # Find the index of 'trades' in the path
-                        trades_index = parts.index('trades')
-                        # The scenario should be the part after 'trades'
-                        if trades_index + 1 < len(parts):
-                            scenario = parts[trades_index + 1]
-                        else:
-                            scenario = "unknown_scenario"
-                    else:
-                        scenario = "unknown_scenario"
-
-
-                    # Add scenario column to the DataFrame - handle both possible column names
-                    if 'TraderID' in df.columns:
-                        traderId_idx = df.columns.get_loc('TraderID')
-                        df.insert(traderId_idx + 1, 'Scenario', scenario)
-                    elif 'traderId' in df.columns:
-                        traderId_idx = df.columns.get_loc('traderId')
-                        df.insert(traderId_idx + 1, 'Scenario', scenario)
-                    else:
-                        # If neither column exists, add the scenario as the first column
-                        df.insert(0, 'Scenario', scenario)
-
-                    aggregated_df_list.append(df)
-                except Exception as e:
-                    print(f"Error reading {file_path}: {e}")
-
-    if aggregated_df_list and len(aggregated_df_list) > 0:
-        # Concatenate all the DataFrames
-        combined_df = pd.concat(aggregated_df_list, ignore_index=True)
-
-        # Sort by CompositeScore if it exists
-        if 'CompositeScore' in combined_df.columns:
-            combined_df.sort_values(by="CompositeScore", inplace=True, ascending=False)
+    file_paths = []
+    scenarios = []
+
+    # Recursively find all files ending with _filtered_summary.csv. iglob is scandir-backed and lazy; the
+    # directory itself is escaped so characters like [ * ? in it are matched literally.
+    # The scenario only depends on the directory, so it is worked out once per directory.
+    scenario_by_dir = {}
+    pattern = os.path.join(glob.escape(base_output_dir), "**", "*_filtered_summary.csv")
+    for file_path in glob.iglob(pattern, recursive=True):
+        directory = os.path.dirname(file_path)
+        if directory not in scenario_by_dir:
+            scenario_by_dir[directory] = _scenario_from_dir(directory)
+        file_paths.append(file_path)
+        scenarios.append(scenario_by_dir[directory])
+
+    # Only parse the files that were not already read ahead of time
+    preloaded_tables = preloaded_tables or {}
+    paths_to_read = [file_path for file_path in file_paths if file_path not in preloaded_tables]
+    scenarios_to_read = [scenario for file_path, scenario in zip(file_paths, scenarios)
+                         if file_path not in preloaded_tables]
+    print(f"Processing {len(file_paths)} _filtered_summary.csv files "
+          f"({len(file_paths) - len(paths_to_read)} already read)...")
+
+    # Parse the remaining files in parallel, then put every table back in discovery order
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        read_tables = dict(zip(paths_to_read, executor.map(_read_one, paths_to_read, scenarios_to_read)))
+    tables = [preloaded_tables[file_path] if file_path in preloaded_tables else read_tables[file_path]
+              for file_path in file_paths]
+    aggregated_tables = [table for table in tables if table is not None]
+
+    if aggregated_tables and len(aggregated_tables) > 0:
+        # Concatenate all the tables in one go. When every file has the same schema (the usual case)
+        # this is a zero-copy append; otherwise widen column types where files disagree (e.g. int64 vs double)
+        first_schema = aggregated_tables[0].schema
+        if all(table.schema.equals(first_schema) for table in aggregated_tables):
+            combined_table = pa.concat_tables(aggregated_tables)
+        else:
+            combined_table = pa.concat_tables(aggregated_tables, promote_options="permissive")
+
+        # Move the requested column to the front; selecting columns does not copy any data
+        if first_column in combined_table.column_names:
+            combined_table = combined_table.select(
+                [first_column] + [name for name in combined_table.column_names if name != first_column])
+
+        # Sort by CompositeScore if it exists. Arrow computes stable sort indices on the single (numeric)
+        # score column and gathers every column with one take; NaN/empty scores end up last as before.
+        if 'CompositeScore' in combined_table.column_names:
+            scores = pc.cast(combined_table['CompositeScore'], pa.float64())
+            sort_indices = pc.array_sort_indices(scores, order="descending", null_placement="at_end")
+            combined_table = combined_table.take(sort_indices)
 
         # Write the aggregated data to a new CSV file
-        combined_df.to_csv(aggregated_file_path, index=False)
+        pacsv.write_csv(combined_table, aggregated_file_path)
         print(f"Aggregated CSV saved to: {aggregated_file_path}")
     else:
         print("No files ending with _filtered_summary.csv found or all files were empty.")
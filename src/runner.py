@@ -2,13 +2,38 @@ import argparse
 import os
 import shutil
 import csv
-import glob
+import tarfile
+import io
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
 import boto3
+from boto3.s3.transfer import create_transfer_manager
+from botocore.config import Config
 
-from extractor import download_and_unzip_all_trades
-from filtered_summary_aggregator import aggregate_filtered_summary_files
+from extractor import TRANSFER_MANAGER_CFG, download_and_unzip_all_trades
+from filtered_summary_aggregator import aggregate_filtered_summary_files, read_filtered_summaries
+
+# Text columns with only a few distinct values are read as this and become pandas categoricals
+_DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# Quote every field, header included, like csv.QUOTE_ALL
+_QUOTE_ALL_WRITE_OPTIONS = pacsv.WriteOptions(quoting_style="all_valid")
+
+# Set S3_ACCELERATE_UPLOADS=1 to upload through S3 Transfer Acceleration (the bucket must have it enabled).
+# Only worth it when the runner is far from eu-central-1; downloads always use the regional endpoint.
+S3_ACCELERATE_UPLOADS = os.environ.get("S3_ACCELERATE_UPLOADS") == "1"
+
+# Set S3_UPLOAD_BUNDLE=1 to upload the graphs/ and trades/ folders as a single upload.tar (one multipart PUT)
+# instead of one request per file. Consumers must then unpack it; the top-level CSVs are still uploaded as-is.
+S3_UPLOAD_BUNDLE = os.environ.get("S3_UPLOAD_BUNDLE") == "1"
+UPLOAD_BUNDLE_NAME = "upload.tar"
 
 
 def parse_arguments():
@@ -18,17 +43,18 @@ def parse_arguments():
     parser.add_argument(
         "--skip-download",
         action="store_true", # Sets args.skip_download to True if flag is present
-        help="If set, skip deleting the output directory and downloading/unzipping files."
+        help="If set, skip cleaning the output directory and syncing/unzipping files from S3."
     )
     # Add other arguments if they exist
     return parser.parse_args()
 
 
 
-def copy_graphs_to_directory(symbol, aggregated_file_path, output_graph_dir, output_trades_dir):
+def copy_graphs_to_directory(symbol, summary_df, output_graph_dir, output_trades_dir):
     """
     Copy graphs from their original locations to a consolidated graphs directory
-    based on entries in the aggregated_filtered_summary.csv
+    based on entries in the aggregated filtered summary
+    :param summary_df: The aggregated summary DataFrame (needs TraderID and Scenario columns)
     :param output_trades_dir: 
     """
     # Create graphs directory if it doesn't exist
@@ -38,79 +64,88 @@ def copy_graphs_to_directory(symbol, aggregated_file_path, output_graph_dir, out
     os.makedirs(output_trades_dir, exist_ok=True)
     print(f"Created '{output_trades_dir}' directory for consolidated trades.")
 
-    # Read the aggregated summary file
-    with open(aggregated_file_path, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-
-        for row in reader:
-            trader_id = row['TraderID']
-            scenario = row['Scenario']
-
-            # Construct the source path pattern to find the graph
-            graph_source_pattern = os.path.join(
-                "output",
-                f"{symbol}*",
-                "trades",
-                scenario,
-                "graphs",
-                f"trades-and-profit-{trader_id}.png"
-            )
+    # Index every graph and trades file once up front, keyed by (scenario, trader_id), instead of globbing per row.
+    # Each scenario folder is visited once with os.scandir, so no per-file stat calls or pattern matching.
+    graph_index = {}
+    trade_index = {}
+    graph_prefix = "trades-and-profit-"
+    for symbol_dir in _scandir_dirs("output"):
+        if not symbol_dir.name.startswith(symbol):
+            continue
+        for scenario_dir in _scandir_dirs(os.path.join(symbol_dir.path, "trades")):
+            scenario = scenario_dir.name
+            for entry in _scandir_files(os.path.join(scenario_dir.path, "graphs")):
+                if entry.name.startswith(graph_prefix) and entry.name.endswith(".png"):
+                    trader_id = entry.name[len(graph_prefix):-len(".png")]
+                    graph_index.setdefault((scenario, trader_id), []).append(entry.path)
+            for entry in _scandir_files(os.path.join(scenario_dir.path, "trades", "formatted-trades")):
+                if entry.name.endswith(".csv"):
+                    trader_id = entry.name[:-len(".csv")]
+                    trade_index.setdefault((scenario, trader_id), []).append(entry.path)
+
+    # Collect the copies first (destination -> source) and run them on a thread pool afterwards.
+    # Keyed by destination so that, as with sequential copying, the last match for a destination wins.
+    copy_tasks = {}
+
+    # Destination names are <symbol>_<scenario>_<trader_id>.png/.csv; the directory and symbol part is built once
+    graph_destination_prefix = os.path.join(output_graph_dir, f"{symbol}_")
+    trade_destination_prefix = os.path.join(output_trades_dir, f"{symbol}_")
+
+    # The summary is already in memory, so only the two columns we need are taken from it (as text, as
+    # they appear in the file names) rather than reading the written summary back in
+    trader_ids = summary_df['TraderID'].astype(str).to_numpy()
+    scenarios = summary_df['Scenario'].astype(str).to_numpy()
+    for trader_id, scenario in zip(trader_ids, scenarios):
+        # Find all graphs for this trader in this scenario; they share one destination, so the last one wins
+        matching_files = graph_index.get((scenario, trader_id))
+
+        if matching_files:
+            copy_tasks[f"{graph_destination_prefix}{scenario}_{trader_id}.png"] = matching_files[-1]
+        else:
+            print(f"Warning: No graph found for trader {trader_id} in scenario {scenario}")
+
+        # Find all trades files for this trader in this scenario
+        matching_trades_files = trade_index.get((scenario, trader_id))
+
+        if matching_trades_files:
+            copy_tasks[f"{trade_destination_prefix}{scenario}_{trader_id}.csv"] = matching_trades_files[-1]
+        else:
+            print(f"Warning: No trades found for trader {trader_id} in scenario {scenario}")
+
+    # Copying is IO bound, so overlap the copies
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(_copy_file, copy_tasks.values(), copy_tasks.keys()))
+    print(f"Copied {len(copy_tasks)} graph and trades files.")
 
-            # Find all files matching the pattern
-            matching_files = glob.glob(graph_source_pattern)
-
-            if matching_files:
-                for source_file in matching_files:
-                    # Create destination filename
-                    destination_file = os.path.join(
-                        output_graph_dir,
-                        f"{symbol}_{scenario}_{trader_id}.png"
-                    )
-                    # Copy the file
-                    shutil.copy2(source_file, destination_file)
-                    print(f"Copied: {source_file} -> {destination_file}")
-            else:
-                print(f"Warning: No graph found for trader {trader_id} in scenario {scenario}")
-
-            # Construct the source path pattern to find the graph
-            trade_source_pattern = os.path.join(
-                "output",
-                f"{symbol}*",
-                "trades",
-                scenario,
-                "trades",
-                "formatted-trades",
-                f"{trader_id}.csv"
-            )
+    print(f"Trade and graph copying complete. All trades copied to {output_graph_dir} and {output_trades_dir}")
 
-            # Find all files matching the pattern
-            matching_trades_files = glob.glob(trade_source_pattern)
-
-            if matching_trades_files:
-                for trade_source_file in matching_trades_files:
-                    # Create destination filename
-                    destination_file = os.path.join(
-                        output_trades_dir,
-                        f"{symbol}_{scenario}_{trader_id}.csv"
-                    )
-                    # Copy the file
-                    shutil.copy2(trade_source_file, destination_file)
-                    print(f"Copied: {trade_source_file} -> {destination_file}")
-            else:
-                print(f"Warning: No trades found for trader {trader_id} in scenario {scenario}")
 
-    print(f"Trade and graph copying complete. All trades copied to {output_graph_dir} and {output_trades_dir}")
+def _copy_file(source_file, destination_file):
+    """
+    Copy a single graph or trades file, preserving its metadata. The source files are never modified
+    after extraction, so a hard link is used where possible and no data is moved at all; across
+    filesystems it falls back to shutil.copy2 (which uses os.sendfile on Linux).
+    """
+    # Never write through an existing destination: with --skip-download it may be a hard link
+    # to a file extracted on a previous run
+    if os.path.lexists(destination_file):
+        os.remove(destination_file)
 
+    try:
+        os.link(source_file, destination_file)
+    except OSError:
+        shutil.copy2(source_file, destination_file)
 
-def aggregate_filtered_setup_files(output_file):
+
+def aggregate_filtered_setup_files(output_file=None):
     """
-    Find all filtered setup CSV files and combine them into a single file.
+    Find all filtered setup CSV files and combine them into a single DataFrame,
+    also saved to output_file if one is given.
     Files follow the pattern: output/*/trades/*/trades/filtered-*.csv
     The back_test_id will always be in downloaded keys.
     """
     # Find all filtered setup files
-    file_pattern = os.path.join("output", "*", "trades", "*", "trades", "filtered-*.csv")
-    setup_files = glob.glob(file_pattern)
+    setup_files = list(_iter_filtered_setup_files("output"))
 
     if not setup_files:
         print("No filtered setup files found.")
@@ -118,110 +153,250 @@ def aggregate_filtered_setup_files(output_file):
 
     print(f"Found {len(setup_files)} filtered setup files to aggregate.")
 
-    # Read and combine all files
-    dfs = []
-    for file_path in setup_files:
-        try:
-            # Extract symbol and scenario info from the path
-            path_parts = file_path.split(os.path.sep)
-            symbol = path_parts[1].split("_")[0]  # Extract symbol from directory name
-
-            # Extract scenario from the directory path
-            # The directory structure is: output/symbol/trades/backTestId___scenario_params/trades/filtered-*.csv
-            # The scenario is the part after 'trades' and before the next 'trades'
-            if 'trades' in path_parts:
-                # Find the first occurrence of 'trades' in the path
-                trades_index = path_parts.index('trades')
-                # The scenario should be the part after the first 'trades'
-                if trades_index + 1 < len(path_parts):
-                    scenario = path_parts[trades_index + 1]
-                else:
-                    scenario = "unknown_scenario"
+    # Concatenate the raw CSV text of all files, tagging every data row with its scenario and symbol,
+    # so the rows are parsed in one go instead of building and concatenating a DataFrame per file.
+    # Files are read on a thread pool (keeping their order), and consecutive files that share a header
+    # are merged into one run.
+    runs = []
+    added_files = 0
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for run in executor.map(lambda setup_file: _load_setup_file(*setup_file), setup_files):
+            if run is None:
+                continue
+            if runs and runs[-1].can_merge(run):
+                runs[-1].merge(run)
             else:
-                scenario = "unknown_scenario"
-
-            print(f"Extracted scenario: {scenario}")
+                runs.append(run)
+            added_files += 1
+    print(f"Added data from {added_files} filtered setup files.")
 
-            # Read the CSV file
-            df = pd.read_csv(file_path)
-
-            # Add scenario column as first column, and symbol column
-            df.insert(0, 'scenario', scenario)  # Insert scenario as the first column
-            df['Symbol'] = symbol
-
-            dfs.append(df)
-            print(f"Added data from {file_path}")
-        except Exception as e:
-            # Check if the error message indicates an empty or unparsable CSV file
-            if "No columns to parse from file" in str(e):
-                print(f"Warning: Skipping empty or unparsable file {file_path}. Reason: {e}")
-                continue  # Skip to the next file in the loop
-            else:
-                # For any other type of exception, print the error and re-raise it
-                print(f"Error processing {file_path}: {e}")
-                raise Exception(f"Error processing {file_path}: {e}")
-
-    if not dfs:
+    if not runs:
         print("No valid data found in any files.")
         raise Exception("No valid data found in any files.")
 
-    # Combine all dataframes
-    combined_df = pd.concat(dfs, ignore_index=True)
-
-    # If the DataFrame has an unnamed index column, drop it
-    if any(col.startswith('Unnamed: 0') for col in combined_df.columns):
-        drop_cols = [col for col in combined_df.columns if col.startswith('Unnamed: 0')]
-        combined_df = combined_df.drop(columns=drop_cols)
+    # Parse each run once; with a single shared header (the usual case) there is nothing to concatenate
+    dfs = [df for run in runs for df in run.to_dataframes()]
+    combined_df = dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
 
-    # Reorder columns if 'rank' exists to ensure scenario is first, then rank
-    if 'rank' in combined_df.columns:
-        cols = combined_df.columns.tolist()
-        cols.remove('rank')
-        cols.remove('scenario')
-        cols = ['scenario', 'rank'] + cols
+    # Work out the final column order in one pass: drop any unnamed index column and, if 'rank' exists,
+    # put scenario first, then rank. The frame is only reindexed once, and only if anything changes.
+    cols = [col for col in combined_df.columns if not col.startswith('Unnamed: 0')]
+    if 'rank' in cols:
+        cols = ['scenario', 'rank'] + [col for col in cols if col not in ('scenario', 'rank')]
+    if cols != combined_df.columns.tolist():
         combined_df = combined_df[cols]
 
     # Save the combined data
-    combined_df.to_csv(output_file, index=False)
-    print(f"Aggregated filtered setup data saved to {output_file}")
+    if output_file:
+        combined_df.to_csv(output_file, index=False)
+        print(f"Aggregated filtered setup data saved to {output_file}")
     print(f"Total rows: {len(combined_df)}")
     print(f"Columns order: {', '.join(combined_df.columns[:5])}...")  # Print first 5 columns to verify order
 
     return combined_df
 
 
-def reorder_aggregated_summary(input_file, output_file):
+def _scandir_dirs(path):
+    """Yield the non-hidden subdirectories of path (as glob's '*' would match them), or nothing if path is missing."""
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if not entry.name.startswith(".") and entry.is_dir():
+                    yield entry
+    except (FileNotFoundError, NotADirectoryError):
+        return
+
+
+def _scandir_files(path):
+    """Yield the files in path, or nothing if path is missing."""
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield entry
+    except (FileNotFoundError, NotADirectoryError):
+        return
+
+
+def _iter_filtered_setup_files(root):
+    """
+    Yield (path, symbol, scenario) for every root/<symbol dir>/trades/<scenario>/trades/filtered-*.csv.
+    The tree has a fixed shape, so it is walked with nested os.scandir calls instead of expanding the
+    wildcards with glob, and the symbol and scenario come straight from the directory names.
+    The symbol is the symbol directory name up to the first '_'.
+    """
+    for symbol_dir in _scandir_dirs(root):
+        symbol = symbol_dir.name.split("_")[0]
+        for scenario_dir in _scandir_dirs(os.path.join(symbol_dir.path, "trades")):
+            for entry in _scandir_files(os.path.join(scenario_dir.path, "trades")):
+                if entry.name.startswith("filtered-") and entry.name.endswith(".csv"):
+                    yield entry.path, symbol, scenario_dir.name
+
+
+@dataclass
+class _SetupRun:
+    """
+    Consecutive filtered setup files that share a header, held as raw data rows (each already tagged
+    with its scenario and symbol) so they can be parsed together, or a single file that has already
+    been parsed by pandas (frame).
     """
-    Reorder the columns in the aggregated filtered summary to make Scenario first
+    files: list  # (file_path, symbol, scenario) of every file in the run
+    header: bytes = None
+    rows: list = field(default_factory=list)
+    frame: pd.DataFrame = None
+
+    def can_merge(self, other):
+        return self.frame is None and other.frame is None and self.header == other.header
+
+    def merge(self, other):
+        self.files.extend(other.files)
+        self.rows.extend(other.rows)
+
+    def to_dataframes(self):
+        if self.frame is not None:
+            return [self.frame]
+        try:
+            return [_parse_setup_rows(self.header, self.rows)]
+        except pa.ArrowInvalid as e:
+            # e.g. rows with a different number of fields, or values Arrow can't fit one type;
+            # pandas reads such files one at a time as it always has
+            print(f"Warning: Could not parse {len(self.files)} setup files in one go ({e}). Reading them one by one.")
+            return [_read_setup_file_with_pandas(*setup_file) for setup_file in self.files]
+
+
+def _load_setup_file(file_path, symbol, scenario):
+    """
+    Read one filtered setup file as raw lines, with the scenario prepended and the symbol appended
+    to every data row. Files with quoted fields (which may contain commas or newlines, so can't be
+    split into lines) are parsed with pandas instead.
+
+    :return: A _SetupRun holding just this file, or None if the file is empty.
+    """
+    setup_file = (file_path, symbol, scenario)
+    try:
+        with open(file_path, "rb") as f:
+            data = f.read()
+
+        if b'"' in data:
+            return _SetupRun(files=[setup_file], frame=_read_setup_file_with_pandas(*setup_file))
+
+        # Split into raw lines, ignoring blank lines as pandas does
+        lines = [line.rstrip(b"\r") for line in data.split(b"\n") if line.strip()]
+
+        if not lines:
+            print(f"Warning: Skipping empty or unparsable file {file_path}. Reason: No columns to parse from file")
+            return None
+
+        # Add scenario as the first column and symbol as the last column of every row
+        prefix = scenario.encode() + b","
+        suffix = b"," + symbol.encode()
+        rows = [prefix + line + suffix for line in lines[1:]]
+
+        return _SetupRun(files=[setup_file], header=lines[0], rows=rows)
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        raise Exception(f"Error processing {file_path}: {e}")
+
+
+def _read_setup_file_with_pandas(file_path, symbol, scenario):
+    """Read one filtered setup file with pandas and add its scenario (first) and Symbol (last) columns."""
+    df = pd.read_csv(file_path)
+    df.insert(0, 'scenario', scenario)
+    df['Symbol'] = symbol
+    return df
+
+
+def _parse_setup_rows(header, rows):
+    """
+    Parse the data rows of one or more filtered setup files that share a header.
+    Each row already has its scenario prepended and its symbol appended.
+    """
+    # Take the column names from the original header, so unnamed and duplicate columns are
+    # named exactly as when a single file is read with pandas
+    columns = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+    names = ['scenario'] + columns + ['Symbol']
+
+    if not rows:
+        return pd.DataFrame(columns=names)
+
+    # Arrow's multithreaded CSV parser does the heavy lifting; only the result is converted to pandas.
+    # scenario and Symbol repeat the same few values on every row, so they are dictionary encoded and
+    # become categoricals (small integer codes) instead of one Python string per row.
+    table = _arrow_read_csv(b"\n".join(rows), read_options=pacsv.ReadOptions(column_names=names),
+                            column_types={'scenario': _DICTIONARY_STRING, 'Symbol': _DICTIONARY_STRING})
+    return table.to_pandas()
+
+
+def _arrow_read_csv(source, read_options=None, column_types=None):
+    """
+    Parse a CSV file path (or raw CSV bytes) with Arrow. Arrow turns date and time text into temporal
+    types, which pandas would keep as the original text, so such columns are read again as strings.
+    """
+    def read(types):
+        data = io.BytesIO(source) if isinstance(source, bytes) else source
+        # Treat empty and NA-like cells in text columns as missing, as pandas does
+        convert_options = pacsv.ConvertOptions(strings_can_be_null=True, column_types=types)
+        return pacsv.read_csv(data, read_options=read_options, convert_options=convert_options)
+
+    column_types = column_types or {}
+    table = read(column_types)
+
+    temporal_columns = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+    if temporal_columns:
+        table = read({**column_types, **{name: pa.string() for name in temporal_columns}})
+    return table
+
+
+def _read_summary_csv(input_file):
+    """
+    Read the aggregated summary CSV with Arrow's multithreaded parser into a pandas DataFrame
+    that has the same types as pd.read_csv would give it.
+    """
+    table = _arrow_read_csv(input_file)
+
+    # pandas would rename duplicate or empty column names; leave such files to pandas
+    names = table.column_names
+    if len(set(names)) != len(names) or '' in names:
+        return pd.read_csv(input_file)
+
+    return table.to_pandas()
+
+
+def reorder_aggregated_summary(input_file, output_file=None):
+    """
+    Reorder the columns in the aggregated filtered summary to make Scenario first,
+    saving the result to output_file if one is given
     """
 
     # Read the CSV file
-    df = pd.read_csv(input_file)
+    df = _read_summary_csv(input_file)
 
     # Check if 'Scenario' column exists
     if 'Scenario' in df.columns:
-        # Reorder columns to put 'Scenario' first
-        cols = df.columns.tolist()
-        cols.remove('Scenario')
-        cols = ['Scenario'] + cols
-        df = df[cols]
+        # Reorder columns to put 'Scenario' first, unless the file was already written that way
+        if df.columns[0] != 'Scenario':
+            df = df[['Scenario'] + [col for col in df.columns if col != 'Scenario']]
 
         # Save the reordered DataFrame
-        df.to_csv(output_file, index=False)
-        print(f"Reordered aggregated summary saved with 'Scenario' as first column to {output_file}")
+        if output_file:
+            df.to_csv(output_file, index=False)
+            print(f"Reordered aggregated summary saved with 'Scenario' as first column to {output_file}")
         print(f"Columns order: {', '.join(df.columns[:5])}...")  # Print first 5 columns to verify order
         return df
     else:
         print(f"Warning: 'Scenario' column not found in {input_file}")
         # Just copy the file if no reordering is needed
-        shutil.copy2(input_file, output_file)
-        return pd.read_csv(input_file)
+        if output_file:
+            shutil.copy2(input_file, output_file)
+        # The file is unchanged, so the DataFrame already read is returned rather than parsing it again
+        return df
 
 
 
-def sort_filtered_setups_by_summary(filtered_setups_df, summary_df, output_file):
+def sort_filtered_setups_by_summary(filtered_setups_df, summary_df, output_file=None):
     """
-    Sort the filtered setups DataFrame to match the order of scenarios and trader IDs in the summary DataFrame
+    Sort the filtered setups DataFrame to match the order of scenarios and trader IDs in the summary DataFrame,
+    saving the result to output_file if one is given
     """
 
     print("Sorting filtered setups to match the order in aggregated summary...")
@@ -230,61 +405,47 @@ def sort_filtered_setups_by_summary(filtered_setups_df, summary_df, output_file)
     if 'scenario' not in filtered_setups_df.columns or 'traderid' not in filtered_setups_df.columns:
         print("Warning: Required columns ('scenario', 'traderid') not found in filtered setups. Skipping sorting.")
         # Save the original dataframe if columns are missing
-        filtered_setups_df.to_csv(output_file, index=False)
+        if output_file:
+            filtered_setups_df.to_csv(output_file, index=False)
         return filtered_setups_df
 
     if 'Scenario' not in summary_df.columns or 'TraderID' not in summary_df.columns:
         print("Warning: Required columns ('Scenario', 'TraderID') not found in summary. Skipping sorting.")
         # Save the original dataframe if columns are missing
-        filtered_setups_df.to_csv(output_file, index=False)
+        if output_file:
+            filtered_setups_df.to_csv(output_file, index=False)
         return filtered_setups_df
 
-    # Create a mapping for sorting
-    # First, create a DataFrame with just Scenario and TraderID from summary
-    order_df = summary_df[['Scenario', 'TraderID']].copy()
-
-    # Rename summary columns to lowercase to match filtered_setups_df for the merge
-    order_df.rename(columns={'Scenario': 'scenario', 'TraderID': 'traderid'}, inplace=True)
-
-    # Add a sort index to preserve the order from the summary
-    order_df['sort_order'] = range(len(order_df))
-
-    # Create a merged dataframe to get the sort order
-    # Use left join to keep all the filtered_setups rows
-    # Now we can use 'on' because the column names match
-    merged_df = pd.merge(
-        filtered_setups_df,
-        order_df,
-        how='left',
-        on=['scenario', 'traderid'] # Use 'on' now that names match
+    # Map each (scenario, trader id) in the summary to its position, preserving the order from the summary.
+    # Looking the filtered setups up in this dict gives each row its sort position without a merge.
+    sort_positions = {key: position for position, key in enumerate(zip(summary_df['Scenario'], summary_df['TraderID']))}
+    unmatched = len(sort_positions)
+    sort_order = np.fromiter(
+        (sort_positions.get(key, unmatched) for key in zip(filtered_setups_df['scenario'], filtered_setups_df['traderid'])),
+        dtype=np.int64,
+        count=len(filtered_setups_df),
     )
 
-    # Check for rows that didn't merge (indicating potential data mismatches)
-    unmerged_count = merged_df['sort_order'].isna().sum()
+    # Check for rows that didn't match (indicating potential data mismatches)
+    unmerged_count = int((sort_order == unmatched).sum())
     if unmerged_count > 0:
         print(f"Warning: {unmerged_count} rows in filtered setups did not find a match in the summary.")
         raise Exception(f"Warning: {unmerged_count} rows in filtered setups did not find a match in the summary.")
 
-    # Sort the merged dataframe by the sort order
-    # Use fillna with a large value to push non-matches (NaNs) to the end
-    merged_df = merged_df.sort_values(
-        by='sort_order',
-        na_position='last' # Keep non-matched rows at the end
-    )
-
-    # Drop the extra column used for sorting
-    merged_df = merged_df.drop(columns=['sort_order'])
+    # Reorder the rows by their position in the summary with a single stable argsort
+    sorted_df = filtered_setups_df.iloc[np.argsort(sort_order, kind='stable')].reset_index(drop=True)
 
     # Save the sorted dataframe
-    merged_df.to_csv(output_file, index=False)
-    print(f"Sorted filtered setups saved to {output_file}")
-    print(f"Total rows: {len(merged_df)}")
+    if output_file:
+        sorted_df.to_csv(output_file, index=False)
+        print(f"Sorted filtered setups saved to {output_file}")
+    print(f"Total rows: {len(sorted_df)}")
     if unmerged_count > 0:
         print(f"Note: {unmerged_count} rows without a summary match are placed at the end.")
         raise Exception(f"Warning: {unmerged_count} rows without a summary match are placed at the end.")
 
 
-    return merged_df
+    return sorted_df
 
 
 def create_setups_file(filtered_setups_df, output_file):
@@ -314,19 +475,22 @@ def create_setups_file(filtered_setups_df, output_file):
             print(f"Warning: Missing required columns in filtered setups: {missing_columns}")
             return None
 
-    # Extract only the required columns
-    setups_df = filtered_setups_df[required_columns].copy()
-
-    # Add a sequential row number as the first column
-    setups_df.insert(0, '', range(1, len(setups_df) + 1))
+    # Build the frame in one go: a sequential row number as the first column, then only the required columns
+    setups_df = pd.DataFrame({'': np.arange(1, len(filtered_setups_df) + 1),
+                              **{col: filtered_setups_df[col].to_numpy() for col in required_columns}})
 
     # Format the 'hourofday' column to include the file comment if not already present
     if ' #file:runner.py ' not in str(setups_df['hourofday'].iloc[0]):
         setups_df = setups_df.rename(columns={'hourofday': 'hourofday #file:runner.py '})
 
-    # Save the dataframe with the specified format
-    # Use quoting=csv.QUOTE_ALL to quote all fields
-    setups_df.to_csv(output_file, index=False, quoting=csv.QUOTE_ALL)
+    # Save the dataframe with the specified format, quoting all fields.
+    # Arrow's writer is several times faster and quotes integers exactly as pandas does; other types
+    # (floats, missing values) are formatted differently by the two, so those go through pandas.
+    if all(pd.api.types.is_integer_dtype(dtype) for dtype in setups_df.dtypes):
+        pacsv.write_csv(pa.Table.from_pandas(setups_df, preserve_index=False), output_file,
+                        write_options=_QUOTE_ALL_WRITE_OPTIONS)
+    else:
+        setups_df.to_csv(output_file, index=False, quoting=csv.QUOTE_ALL)
 
     print(f"Simplified setups file created at {output_file}")
     print(f"Total rows: {len(setups_df)}")
@@ -341,7 +505,7 @@ def add_rank_column_to_filtered_setups(df):
     """
     if df is not None:
         print("Adding rank column to filtered setups...")
-        df.insert(0, 'Rank', range(1, len(df) + 1))
+        df.insert(0, 'Rank', np.arange(1, len(df) + 1))
         return df
     return None
 
@@ -358,11 +522,39 @@ def add_rank_column_to_summary(df):
         #     df.insert(1, 'Rank', range(1, len(df) + 1))
         # else:
             # Insert as first column
-        df.insert(0, 'Rank', range(1, len(df) + 1))
+        df.insert(0, 'Rank', np.arange(1, len(df) + 1))
         return df
     return None
 
 
+def _upload_file(transfer_manager, s3_bucket, local_path, s3_key):
+    """Queue a single file from the upload directory for upload to S3 and return its transfer future."""
+    # Tell S3 consumers that gzipped CSVs are CSV content with gzip encoding
+    extra_args = {}
+    if local_path.endswith(".csv.gz"):
+        extra_args = {"ContentEncoding": "gzip", "ContentType": "text/csv"}
+
+    print(f"Uploading {local_path} to s3://{s3_bucket}/{s3_key}...")
+
+    return transfer_manager.upload(local_path, s3_bucket, s3_key, extra_args=extra_args)
+
+
+def _write_upload_bundle(upload_dir, bundle_path):
+    """
+    Pack every subdirectory of the upload directory (graphs/, trades/) into one uncompressed tar file.
+    The PNGs are already compressed, so the tar is only there to turn thousands of small uploads into one.
+
+    :param upload_dir: The upload directory.
+    :param bundle_path: Where to write the tar file (outside upload_dir).
+    """
+    print(f"Bundling the folders in '{upload_dir}' into {bundle_path}...")
+    with tarfile.open(bundle_path, "w") as bundle:
+        with os.scandir(upload_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir(follow_symlinks=False):
+                    bundle.add(entry.path, arcname=entry.name)
+
+
 def main():
     args = parse_arguments() # Parse arguments first
 
@@ -374,11 +566,20 @@ def main():
 
     # --- Conditional Directory Cleanup ---
     if not args.skip_download:
-        if os.path.exists(output_dir):
-            print(f"Deleting existing '{output_dir}' directory...")
-            shutil.rmtree(output_dir)
+        # Keep the previously extracted trades for this symbol so the download only fetches
+        # archives that changed. Everything else (other symbols, old uploads and aggregates) goes.
+        # Stale entries are only renamed into a trash folder here, which is instant; the folder is deleted
+        # on a background thread while the pipeline carries on. A trash folder left by an interrupted
+        # run is itself a stale entry, so it is cleaned up by the next run.
         os.makedirs(output_dir, exist_ok=True)
-        print(f"Created fresh '{output_dir}' directory.")
+        trash_dir = tempfile.mkdtemp(prefix=".trash-", dir=output_dir)
+        stale_entries = [entry for entry in os.scandir(output_dir)
+                         if entry.name not in (args.symbol, os.path.basename(trash_dir))]
+        for entry in stale_entries:
+            print(f"Deleting stale '{entry.path}'...")
+            os.rename(entry.path, os.path.join(trash_dir, entry.name))
+        threading.Thread(target=shutil.rmtree, args=(trash_dir,), kwargs={"ignore_errors": True}).start()
+        print(f"Cleared '{output_dir}' except for the existing '{args.symbol}' trades.")
     else:
         print(f"Skipping output directory deletion as --skip-download is set.")
         # Ensure the base output directory exists even if skipping deletion
@@ -400,31 +601,53 @@ def main():
     output_directory = os.path.join(output_dir, args.symbol)
     os.makedirs(output_directory, exist_ok=True) # Ensure it exists
 
-    s3_client = boto3.client("s3", region_name="eu-central-1")
+    # One client is shared by every download and upload thread, so give it enough pooled
+    # connections for them all (the default is 10) and keep those connections alive
+    s3_config = Config(
+        max_pool_connections=TRANSFER_MANAGER_CFG.max_concurrency,
+        retries={"mode": "adaptive", "max_attempts": 10},
+        tcp_keepalive=True,
+        s3={"addressing_style": "virtual"},
+    )
+    s3_client = boto3.client("s3", region_name="eu-central-1", config=s3_config)
+
+    upload_s3_client = s3_client
+    if S3_ACCELERATE_UPLOADS:
+        accelerate_config = s3_config.merge(Config(s3={"addressing_style": "virtual", "use_accelerate_endpoint": True}))
+        upload_s3_client = boto3.client("s3", region_name="eu-central-1", config=accelerate_config)
 
     # --- Conditional Download ---
+    # Summaries of scenarios unzipped during the download, parsed while the remaining archives download
+    preloaded_summary_tables = {}
     if not args.skip_download:
         print("Proceeding with download and extraction...")
         # Make sure download_and_unzip_all_trades is defined or imported correctly
         # Passing None for back_test_id to process all back test IDs
-        download_and_unzip_all_trades(args.symbol, output_directory, "mochi-prod-trade-performance-graphs", s3_client)
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as summary_executor:
+            summary_futures = []
+            download_and_unzip_all_trades(
+                args.symbol, output_directory, "mochi-prod-trade-performance-graphs", s3_client,
+                on_scenario_ready=lambda folder: summary_futures.append(
+                    summary_executor.submit(read_filtered_summaries, folder)),
+            )
+            for future in summary_futures:
+                preloaded_summary_tables.update(future.result())
     else:
         print(f"Skipping download and extraction for {args.symbol} as --skip-download is set.")
 
     # --- The rest of the main function remains largely the same ---
-    # Define paths relative to the potentially existing structure
-    formatted_trades_dir = os.path.join(output_directory, "trades", "formatted-trades")
     # The base_output_dir should be the parent directory of all the scenario directories
-    # Since the files are extracted to output/[symbol]/trades/[scenario]
-    base_output_dir = os.path.join("output", args.symbol) # This path depends on download structure
+    # Since the files are extracted to output/[symbol]/trades/[scenario], that is the symbol directory
+    base_output_dir = output_directory
 
     # Define the path for temporary and final files
     # Using os.path.join for better cross-platform compatibility
+    # Only the aggregated summary is written as an intermediate file; the other stages hand their
+    # DataFrames straight to the next one and just the upload artifacts are written
     temp_aggregated_file_path = os.path.join(output_dir, "aggregated_filtered_summary.csv")
-    temp_aggregated_with_rank_path = os.path.join(output_dir, "aggregated_filtered_summary_with_rank.csv")
-    final_aggregated_file_path = os.path.join(upload_dir, "aggregated_filtered_summary.csv")
-    temp_filtered_setups_path = os.path.join(output_dir, "temp_filtered_setups.csv")
-    temp_sorted_filtered_setups_path = os.path.join(output_dir, "sorted_filtered_setups.csv")
+    # The ranked summary is the largest upload and compresses well, so it is stored gzipped
+    final_aggregated_file_path = os.path.join(upload_dir, "aggregated_filtered_summary.csv.gz")
+    final_aggregated_parquet_path = os.path.join(upload_dir, "aggregated_filtered_summary.parquet")
     final_filtered_setups_path = os.path.join(upload_dir, "filtered-setups.csv")
     final_setups_path = os.path.join(upload_dir, "setups.csv")
 
@@ -434,30 +657,34 @@ def main():
 
     # Generate the aggregated filtered summary
     # This should work correctly as it reads from base_output_dir which exists whether downloaded or skipped
-    aggregate_filtered_summary_files(base_output_dir, temp_aggregated_file_path)
+    # Scenario is written as the first column, so the summary does not need reordering afterwards
+    aggregate_filtered_summary_files(base_output_dir, temp_aggregated_file_path, preloaded_summary_tables,
+                                     first_column='Scenario')
 
     # Reorder the aggregated summary to put Scenario first
-    summary_df = reorder_aggregated_summary(temp_aggregated_file_path, temp_aggregated_with_rank_path)
+    summary_df = reorder_aggregated_summary(temp_aggregated_file_path)
 
     # Add rank column to summary
     summary_with_rank_df = add_rank_column_to_summary(summary_df)
 
     # Save the summary with rank to the final path
     if summary_with_rank_df is not None:
-        summary_with_rank_df.to_csv(final_aggregated_file_path, index=False)
+        summary_with_rank_df.to_csv(final_aggregated_file_path, index=False, compression="gzip")
         print(f"Saved summary with rank to {final_aggregated_file_path}")
+        # Columnar copy for consumers that can read Parquet directly
+        summary_with_rank_df.to_parquet(final_aggregated_parquet_path, compression="zstd", index=False)
+        print(f"Saved summary with rank to {final_aggregated_parquet_path}")
 
-    # Copy graphs to the graphs directory inside upload using the final file
+    # Copy graphs to the graphs directory inside upload using the ranked summary
     # This also relies on the base_output_dir structure existing
-    copy_graphs_to_directory(args.symbol, final_aggregated_file_path, graphs_dir, trades_dir)
+    copy_graphs_to_directory(args.symbol, summary_with_rank_df, graphs_dir, trades_dir)
 
-    # Aggregate all filtered setup files to a temporary file
+    # Aggregate all filtered setup files
     # This function needs to correctly find files within the potentially pre-existing base_output_dir structure
-    filtered_setups_df = aggregate_filtered_setup_files(temp_filtered_setups_path)
+    filtered_setups_df = aggregate_filtered_setup_files()
 
     # Sort the filtered setups to match the order in the summary
-    sorted_filtered_setups_df = sort_filtered_setups_by_summary(filtered_setups_df, summary_with_rank_df,
-                                                                temp_sorted_filtered_setups_path)
+    sorted_filtered_setups_df = sort_filtered_setups_by_summary(filtered_setups_df, summary_with_rank_df)
 
     # Add rank column to filtered setups
     filtered_setups_with_rank_df = add_rank_column_to_filtered_setups(sorted_filtered_setups_df)
@@ -477,8 +704,16 @@ def main():
 
     print(f"Uploading contents of '{upload_dir}' to s3://{s3_bucket}/{base_s3_key}/...")
 
-    # Walk through the upload directory
+    # Walk through the upload directory and collect every file to upload
+    upload_tasks = []
+    if S3_UPLOAD_BUNDLE:
+        bundle_path = os.path.join(output_dir, UPLOAD_BUNDLE_NAME)
+        _write_upload_bundle(upload_dir, bundle_path)
+        upload_tasks.append((bundle_path, f"{base_s3_key}/{UPLOAD_BUNDLE_NAME}"))
     for root, dirs, files in os.walk(upload_dir):
+        if S3_UPLOAD_BUNDLE:
+            # Only the top-level files are uploaded individually; the folders are in the bundle
+            dirs.clear()
         for filename in files:
             # Get the local file path
             local_path = os.path.join(root, filename)
@@ -490,15 +725,14 @@ def main():
             # Handle potential Windows path separators
             s3_key = f"{base_s3_key}/{relative_path.replace(os.path.sep, '/')}"
 
+            upload_tasks.append((local_path, s3_key))
 
-            print(f"Uploading {local_path} to s3://{s3_bucket}/{s3_key}...")
-
-            # Upload the file
-            s3_client.upload_file(
-                Filename=local_path,
-                Bucket=s3_bucket,
-                Key=s3_key
-            )
+    # Most uploads are small graphs and CSVs, so run many of them at once. One transfer manager schedules
+    # every PUT (and the parts of large files) on a single request pool sized to the client's connections.
+    with create_transfer_manager(upload_s3_client, TRANSFER_MANAGER_CFG) as transfer_manager:
+        upload_futures = [_upload_file(transfer_manager, s3_bucket, *task) for task in upload_tasks]
+        for upload_future in upload_futures:
+            upload_future.result()
 
     print(f"Upload complete. All files from '{upload_dir}' uploaded to s3://{s3_bucket}/{base_s3_key}/")
 
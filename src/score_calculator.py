@@ -4,10 +4,14 @@ import numpy as np
 import logging
 import sys
 import csv
+import re
 
 # Configure logging (ensure it's configured in the main script)
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Numeric columns whose names contain any of these (case-insensitive) are saved without rounding
+NOT_ROUNDED_COLUMNS = re.compile(r'id|count|duration|year', re.IGNORECASE)
+
 def create_output_directory(path):
     """Creates the output directory if it doesn't exist."""
     # Check if path is None or empty before creating
@@ -18,48 +22,16 @@ def create_output_directory(path):
         logging.warning("Path provided for directory creation is empty or None.")
 
 
-def calculate_z_scores(df, column_name):
+def _to_numeric(series):
     """
-    Calculates Z-scores for a given column in the DataFrame.
-    Handles potential division by zero if standard deviation is 0.
-
-    Args:
-        df (pd.DataFrame): The input DataFrame.
-        column_name (str): The name of the column to calculate Z-scores for.
-
-    Returns:
-        pd.Series: A Series containing the Z-scores for the specified column.
-                   Returns a Series of zeros if standard deviation is 0 or NaN.
+    Converts a Series to numbers, coercing anything unparseable to NaN.
+    Series that are already numeric (the usual case for a clean metrics export) are returned as they are,
+    so callers can tell whether anything was converted with `result is series`.
     """
-    # Ensure the column exists
-    if column_name not in df.columns:
-        logging.error(f"Column '{column_name}' not found for Z-score calculation.")
-        # Return a series of NaNs or zeros, or raise an error, depending on desired handling
-        return pd.Series(np.nan, index=df.index)
-
-    # Ensure column is numeric before calculating mean/std
-    if not pd.api.types.is_numeric_dtype(df[column_name]):
-        logging.warning(f"Column '{column_name}' is not numeric. Attempting conversion for Z-score.")
-        # Attempt conversion, keep track of NaNs introduced
-        numeric_col = pd.to_numeric(df[column_name], errors='coerce')
-        nan_count = numeric_col.isnull().sum() - df[column_name].isnull().sum()
-        if nan_count > 0:
-            logging.warning(f"Coercion introduced {nan_count} NaNs in '{column_name}'.")
-    else:
-        numeric_col = df[column_name]
-
+    if series.dtype.kind in 'fiu':
+        return series
+    return pd.to_numeric(series, errors='coerce')
 
-    mean = numeric_col.mean()
-    std_dev = numeric_col.std()
-
-    # Check for zero or NaN standard deviation or mean
-    if std_dev == 0 or pd.isna(std_dev) or pd.isna(mean):
-        # If all values are the same, std dev is 0, or mean is NaN (e.g., all NaNs), Z-score is 0
-        logging.warning(f"Standard deviation or mean for {column_name} is 0 or NaN. Z-scores set to 0.")
-        return pd.Series(0.0, index=df.index)
-    else:
-        # Calculate Z-score using the numeric version of the column
-        return (numeric_col - mean) / std_dev
 
 def calculate_zscore_composite_score(df):
     """
@@ -99,8 +71,12 @@ def calculate_zscore_composite_score(df):
     # Convert columns to numeric, coercing errors (preserves NaNs)
     logging.info("Converting required columns to numeric for Z-score calculation...")
     for col in required_base_columns:
-        original_dtype = df_calc[col].dtype
-        df_calc[col] = pd.to_numeric(df_calc[col], errors='coerce')
+        column = df_calc[col]
+        numeric_column = _to_numeric(column)
+        if numeric_column is column:
+            continue # Already parsed as numbers by read_csv, the usual case
+        original_dtype = column.dtype
+        df_calc[col] = numeric_column
         if not pd.api.types.is_numeric_dtype(df_calc[col]):
             logging.warning(f"Column '{col}' could not be fully converted to numeric (original dtype: {original_dtype}). Check data quality.")
 
@@ -109,34 +85,41 @@ def calculate_zscore_composite_score(df):
     logging.info("Handling potential infinite values in ratio columns...")
     for col in ['sortino_ratio', 'recovery_factor', 'profit_factor']:
         if col in df_calc.columns:
-            inf_count = np.isinf(df_calc[col]).sum()
-            if inf_count > 0:
-                logging.info(f"Replacing {inf_count} inf/-inf values in '{col}' with NaN.")
-                df_calc[col] = df_calc[col].replace([np.inf, -np.inf], np.nan)
-
-            # Fill NaNs resulting from coercion or infinite values.
+            # Infinite values are treated as NaN, and NaNs resulting from coercion or infinite values are filled.
             # Filling with 0 assumes these cases don't contribute positively or negatively.
             # Consider using median if appropriate: fill_value = df_calc[col].median()
+            # One isfinite scan finds both, and the column is only rewritten if there is something to fill.
             fill_value = 0 # Example: Fill NaN with 0
-            nan_count_before = df_calc[col].isnull().sum()
+            values = df_calc[col].to_numpy(dtype=np.float64)
+            not_finite = ~np.isfinite(values)
+            nan_count_before = not_finite.sum()
             if nan_count_before > 0:
+                inf_count = np.isinf(values[not_finite]).sum()
+                if inf_count > 0:
+                    logging.info(f"Replacing {inf_count} inf/-inf values in '{col}' with NaN.")
                 logging.info(f"Filling {nan_count_before} NaN values in '{col}' with {fill_value}.")
-                df_calc[col] = df_calc[col].fillna(fill_value)
+                df_calc[col] = np.where(not_finite, fill_value, values)
 
 
     # Calculate log_tradecount. Add epsilon to handle tradecount=0 safely.
     # Ensure tradecount is non-negative before log. Fill NaN tradecounts with 0.
     logging.info("Calculating log_tradecount...")
     if 'tradecount' in df_calc.columns:
-        nan_tradecount = df_calc['tradecount'].isnull().sum()
+        tradecount = df_calc['tradecount'].to_numpy(dtype=np.float64)
+        nan_tradecount = np.isnan(tradecount).sum()
         if nan_tradecount > 0:
             logging.info(f"Filling {nan_tradecount} NaN values in 'tradecount' with 0.")
-            df_calc['tradecount'] = df_calc['tradecount'].fillna(0)
 
-        # Ensure tradecount is numeric and non-negative
-        df_calc['tradecount'] = pd.to_numeric(df_calc['tradecount'], errors='coerce').fillna(0).clip(lower=0)
-        # Add 1 before log to handle tradecount=0 correctly (log(1)=0)
-        df_calc['log_tradecount'] = np.log(df_calc['tradecount'] + 1)
+        # Ensure tradecount is non-negative (already numeric from step 3). fmax ignores NaN,
+        # so this fills the NaNs with 0 and clips negative counts in the same pass.
+        tradecount = np.fmax(tradecount, 0.0)
+        df_calc['tradecount'] = tradecount
+        # Add 1 before log to handle tradecount=0 correctly (log(1)=0).
+        # Both steps reuse one buffer; counts are whole numbers, so tradecount + 1 is exact and
+        # log1p would give no extra accuracy (only last-bit differences in the scores).
+        log_tradecount = np.add(tradecount, 1)
+        np.log(log_tradecount, out=log_tradecount)
+        df_calc['log_tradecount'] = log_tradecount
         logging.info("Calculated log(tradecount + 1).")
     else:
         # This case should be caught by the initial check, but added for robustness
@@ -144,32 +127,42 @@ def calculate_zscore_composite_score(df):
 
 
     # --- 4. Calculate Z-Scores ---
-    z_scores = pd.DataFrame(index=df_calc.index)
+    # All metrics are standardised together as one (traders x metrics) matrix rather than column by column
     logging.info("Calculating Z-scores...")
-    for col in metrics_to_standardize.keys(): # Iterate through the keys needed for the score (includes log_tradecount)
-        # Calculate Z-scores using the prepared df_calc DataFrame
-        z_scores[f'z_{col}'] = calculate_z_scores(df_calc, col)
-        # Fill any NaNs that might arise in z-scores (e.g., if std dev was 0 or input col was all NaN)
-        nan_zscore = z_scores[f'z_{col}'].isnull().sum()
+    metric_columns = list(metrics_to_standardize.keys())
+    metrics = df_calc[metric_columns]
+    means = metrics.mean().to_numpy()
+    std_devs = metrics.std().to_numpy()
+
+    # If all values are the same (std dev 0) or a metric is all NaN, its Z-scores are 0
+    constant_metrics = (std_devs == 0) | np.isnan(std_devs) | np.isnan(means)
+    for col in np.asarray(metric_columns)[constant_metrics]:
+        logging.warning(f"Standard deviation or mean for {col} is 0 or NaN. Z-scores set to 0.")
+
+    # Column-major, so each metric's Z-scores are contiguous for the weighted sum below
+    # (pandas already stores every column contiguously, so this normally doesn't copy)
+    metrics_matrix = np.asfortranarray(metrics.to_numpy(dtype=np.float64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = (metrics_matrix - means) / std_devs
+    z_scores[:, constant_metrics] = 0.0
+
+    # Fill any NaNs that might arise in z-scores (e.g. from NaN inputs)
+    nan_zscores = np.isnan(z_scores)
+    for col, nan_zscore in zip(metric_columns, nan_zscores.sum(axis=0)):
         if nan_zscore > 0:
             logging.warning(f"Filling {nan_zscore} NaN values in Z-scores for '{col}' with 0.")
-            z_scores[f'z_{col}'] = z_scores[f'z_{col}'].fillna(0)
-        logging.debug(f"Calculated Z-scores for {col}.")
+    z_scores[nan_zscores] = 0.0
 
 
     # --- 5. Calculate Weighted Composite Score ---
     logging.info("Calculating final weighted Z-score composite score...")
-    # Initialize composite score Series on the original DataFrame's index
-    composite_score_col = pd.Series(0.0, index=df.index)
-    for col, weight in metrics_to_standardize.items():
-        # Note: For max_drawdown_duration, the weight is already negative
-        # Ensure the Z-score column exists before attempting to use it
-        z_col_name = f'z_{col}'
-        if z_col_name in z_scores.columns:
-            composite_score_col += z_scores[z_col_name] * weight
-            logging.debug(f"Added weighted Z-score for {col} (Weight: {weight})")
-        else:
-            logging.warning(f"Z-score column '{z_col_name}' not found. Skipping its contribution to composite score.")
+    # Note: For max_drawdown_duration, the weight is already negative.
+    # The weighted columns are added in metric order (rather than with z_scores @ weights) so the
+    # scores are bit-for-bit the same as summing them one metric at a time.
+    weights = np.fromiter(metrics_to_standardize.values(), dtype=np.float64)
+    composite_score_col = np.zeros(len(df))
+    for j, weight in enumerate(weights):
+        composite_score_col += z_scores[:, j] * weight
 
 
     # Add the final score back to the original DataFrame
@@ -193,19 +186,26 @@ def filter_strategies(df, composite_quantile_threshold=0.90, min_profit_factor=1
     Returns:
         pd.DataFrame: Filtered DataFrame.
     """
-    df_filtered = df.copy() # Work on a copy
+    # Each filter only narrows a boolean mask of the rows to keep; the frame is sliced once at the end
+    # (and the input is never modified)
+    df_filtered = df
     initial_count = len(df_filtered)
     if initial_count == 0:
         logging.warning("Input DataFrame for filtering is empty. Returning empty DataFrame.")
         return df_filtered
 
     logging.info(f"Filtering strategies. Initial count: {initial_count}")
+    keep = np.ones(initial_count, dtype=bool)
 
     # --- Filter by Z-Score Composite Score Quantile ---
     if composite_quantile_threshold is not None and composite_quantile_threshold > 0:
         if 'CompositeScore' in df_filtered.columns and not df_filtered['CompositeScore'].isnull().all():
-            # Ensure CompositeScore is numeric before calculating quantile
-            df_filtered['CompositeScore'] = pd.to_numeric(df_filtered['CompositeScore'], errors='coerce')
+            # Ensure CompositeScore is numeric before calculating quantile (on a new frame, leaving the input as it was)
+            scores = df_filtered['CompositeScore']
+            numeric_scores = _to_numeric(scores)
+            if numeric_scores is not scores:
+                df_filtered = df_filtered.copy(deep=False)
+                df_filtered['CompositeScore'] = numeric_scores
             if not df_filtered['CompositeScore'].isnull().all(): # Check again after coercion
                 try:
                     score_threshold = df_filtered['CompositeScore'].quantile(composite_quantile_threshold)
@@ -213,8 +213,9 @@ def filter_strategies(df, composite_quantile_threshold=0.90, min_profit_factor=1
                         logging.warning(f"Could not calculate {composite_quantile_threshold} quantile for CompositeScore (possibly too few data points). Skipping score filter.")
                     else:
                         logging.info(f"Filtering by Composite Score >= {score_threshold:.4f} ({composite_quantile_threshold*100:.1f}th percentile)")
-                        df_filtered = df_filtered[df_filtered['CompositeScore'] >= score_threshold]
-                        logging.info(f"Strategies after Composite Score filter: {len(df_filtered)} ({len(df_filtered)/initial_count*100:.1f}%)")
+                        keep &= (df_filtered['CompositeScore'] >= score_threshold).to_numpy()
+                        kept_count = keep.sum()
+                        logging.info(f"Strategies after Composite Score filter: {kept_count} ({kept_count/initial_count*100:.1f}%)")
                 except Exception as e:
                     logging.warning(f"Error calculating CompositeScore quantile: {e}. Skipping score filter.")
             else:
@@ -227,12 +228,12 @@ def filter_strategies(df, composite_quantile_threshold=0.90, min_profit_factor=1
     # --- Filter by Raw Profit Factor ---
     # (Assuming profit_factor column exists and is needed for filtering)
     if 'profit_factor' in df_filtered.columns:
-        pf_numeric = pd.to_numeric(df_filtered['profit_factor'], errors='coerce').fillna(0)
+        pf_numeric = _to_numeric(df_filtered['profit_factor']).fillna(0)
         logging.info(f"Filtering by Profit Factor >= {min_profit_factor}")
-        count_before = len(df_filtered)
-        df_filtered = df_filtered[pf_numeric >= min_profit_factor]
-        removed_count = count_before - len(df_filtered)
-        logging.info(f"Strategies after Profit Factor filter: {len(df_filtered)} (Removed {removed_count})")
+        count_before = keep.sum()
+        keep &= (pf_numeric >= min_profit_factor).to_numpy()
+        removed_count = count_before - keep.sum()
+        logging.info(f"Strategies after Profit Factor filter: {keep.sum()} (Removed {removed_count})")
     else:
         # If profit_factor isn't in the input, this filter can't run.
         # It might be calculated within the score function but not added back explicitly,
@@ -243,21 +244,23 @@ def filter_strategies(df, composite_quantile_threshold=0.90, min_profit_factor=1
     # --- Filter by Max Drawdown relative to Total Profit ---
     # (Assuming these columns exist in the input df)
     if 'max_drawdown' in df_filtered.columns and 'totalprofit' in df_filtered.columns:
-        max_dd_numeric = pd.to_numeric(df_filtered['max_drawdown'], errors='coerce')
-        total_profit_numeric = pd.to_numeric(df_filtered['totalprofit'], errors='coerce')
+        max_dd_numeric = _to_numeric(df_filtered['max_drawdown'])
+        total_profit_numeric = _to_numeric(df_filtered['totalprofit'])
 
         valid_comparison = (total_profit_numeric > 0) & (~max_dd_numeric.isna()) & (~total_profit_numeric.isna())
         exceeds_ratio = max_dd_numeric > max_drawdown_ratio * total_profit_numeric
 
-        rows_to_remove_mask = valid_comparison & exceeds_ratio
-        num_to_remove = rows_to_remove_mask.sum()
+        rows_to_remove_mask = (valid_comparison & exceeds_ratio).to_numpy()
+        num_to_remove = (keep & rows_to_remove_mask).sum()
 
         logging.info(f"Filtering by Max Drawdown <= {max_drawdown_ratio * 100}% of Total Profit (where Total Profit > 0)")
-        df_filtered = df_filtered[~rows_to_remove_mask]
-        logging.info(f"Strategies after Max Drawdown filter: {len(df_filtered)} (Removed {num_to_remove})")
+        keep &= ~rows_to_remove_mask
+        logging.info(f"Strategies after Max Drawdown filter: {keep.sum()} (Removed {num_to_remove})")
     else:
         logging.warning("max_drawdown or totalprofit column not found for filtering. Skipping this filter.")
 
+    if not keep.all():
+        df_filtered = df_filtered[keep]
 
     final_count = len(df_filtered)
     logging.info(f"Filtering complete. Final count: {final_count} ({final_count/initial_count*100:.1f}% of initial)")
@@ -267,8 +270,13 @@ def sort_strategies(df, sort_by='CompositeScore', ascending=False):
     """Sort strategies DataFrame by a specific column."""
     if sort_by in df.columns:
         logging.info(f"Sorting strategies by {sort_by} {'ascending' if ascending else 'descending'}")
-        df_sort = df.copy()
-        df_sort[sort_by] = pd.to_numeric(df_sort[sort_by], errors='coerce')
+        # sort_values returns a new frame, so the input only needs copying if the sort column is converted
+        df_sort = df
+        sort_column = df[sort_by]
+        numeric_sort_column = _to_numeric(sort_column)
+        if numeric_sort_column is not sort_column:
+            df_sort = df.copy(deep=False)
+            df_sort[sort_by] = numeric_sort_column
         return df_sort.sort_values(by=sort_by, ascending=ascending, na_position='last')
     else:
         logging.warning(f"Sort column '{sort_by}' not found. Returning unsorted DataFrame.")
@@ -281,15 +289,24 @@ def save_summary(df, output_file):
         return
 
     logging.info(f"Saving summary to {output_file}")
-    df_save = df.copy()
+    # A shallow copy shares the unrounded columns with df; rounded columns are replaced, never written in place
+    df_save = df.copy(deep=False)
     numeric_cols = df_save.select_dtypes(include=np.number).columns
-    cols_to_round = [
-        col for col in numeric_cols
-        if not ('id' in col.lower() or 'count' in col.lower() or 'duration' in col.lower() or 'year' in col.lower())
-    ]
+    cols_to_round = [col for col in numeric_cols if not NOT_ROUNDED_COLUMNS.search(col)]
 
     try:
-        df_save[cols_to_round] = df_save[cols_to_round].round(4)
+        # The float64 columns are rounded together as one 2D array; integer columns are unchanged by rounding
+        float64_cols = [col for col in cols_to_round if df_save[col].dtype == np.float64]
+        other_cols = [col for col in cols_to_round
+                      if col not in float64_cols and not pd.api.types.is_integer_dtype(df_save[col])]
+        if float64_cols:
+            rounded = np.round(df_save[float64_cols].to_numpy(dtype=np.float64), 4)
+            for j, col in enumerate(float64_cols):
+                df_save[col] = rounded[:, j]
+        if other_cols:
+            rounded = df_save[other_cols].round(4)
+            for col in other_cols:
+                df_save[col] = rounded[col]
         logging.info(f"Rounded numeric columns: {cols_to_round}")
     except Exception as e:
         logging.warning(f"Could not round columns: {e}")
@@ -335,14 +352,12 @@ def process_metrics_file(scenario, metrics_file_path, output_directory):
         logging.info(f"Cleaned column names: {summary_df.columns.tolist()}")
 
         # Check for traderid (case-insensitive)
-        traderid_col_found = False
-        for col in summary_df.columns:
-            if col.lower() == 'traderid':
-                if col != 'traderid':
-                    summary_df.rename(columns={col: 'traderid'}, inplace=True)
-                traderid_col_found = True
-                break
-        if not traderid_col_found:
+        traderid_matches = np.flatnonzero(summary_df.columns.str.lower() == 'traderid')
+        if len(traderid_matches) > 0:
+            traderid_col = summary_df.columns[traderid_matches[0]]
+            if traderid_col != 'traderid':
+                summary_df.rename(columns={traderid_col: 'traderid'}, inplace=True)
+        else:
             logging.warning("Column 'traderid' (case-insensitive) not found.")
 
     except FileNotFoundError:
@@ -367,7 +382,7 @@ def process_metrics_file(scenario, metrics_file_path, output_directory):
 
     # --- Save Full Summary (with Z-score composite score) ---
     logging.info("Sorting full summary by CompositeScore...")
-    summary_df_sorted = sort_strategies(summary_df.copy(), sort_by='CompositeScore', ascending=False)
+    summary_df_sorted = sort_strategies(summary_df, sort_by='CompositeScore', ascending=False)
     # Use suffix to indicate Z-score method
     full_summary_file_path = os.path.join(summary_output_dir, f'{scenario}_full_summary_zscore.csv')
     save_summary(summary_df_sorted, full_summary_file_path)
@@ -376,20 +391,17 @@ def process_metrics_file(scenario, metrics_file_path, output_directory):
     logging.info("Filtering strategies based on Z-Score composite score and other criteria...")
     # Adjust filter parameters as needed
     filtered_df = filter_strategies(
-        summary_df_sorted.copy(),
+        summary_df_sorted,
         composite_quantile_threshold=0.90, # Example: Keep top 10% by Z-score
         min_profit_factor=1.2,
         max_drawdown_ratio=0.5
     )
 
-    # --- Sort Filtered Strategies ---
-    logging.info("Sorting filtered summary by CompositeScore...")
-    sorted_filtered_df = sort_strategies(filtered_df, sort_by='CompositeScore', ascending=False)
-
     # --- Save Filtered Summary ---
+    # Filtering keeps the row order, so the strategies are still sorted by CompositeScore and are not sorted again
     # Use suffix to indicate Z-score method
     filtered_summary_path = os.path.join(filtered_output_dir, f'{scenario}_filtered_summary_zscore.csv')
-    save_summary(sorted_filtered_df, filtered_summary_path)
+    save_summary(filtered_df, filtered_summary_path)
 
     logging.info(f"--- Z-Score processing finished successfully for scenario: {scenario} ---")
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules in src/ import each other by their flat names (e.g. "from extractor import ..."), as when run from there
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
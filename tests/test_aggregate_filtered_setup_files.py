@@ -0,0 +1,77 @@
+# test_aggregate_filtered_setup_files.py
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+from runner import aggregate_filtered_setup_files
+
+SYMBOL_DIR = "btc-1mF_polygon_min"
+
+CLEAN_FILES = {
+    "bt1___s_a": ",rank,traderid,dayofweek,hourofday,stop\n0,1,10,1,5,-2\n1,2,11,2,6,-3\n",
+    "bt1___s_b": ",rank,traderid,dayofweek,hourofday,stop\n0,1,12,3,7,-2.5\n1,2,13,4,8,-3\n",
+    "bt2___s_c": 'rank,traderid,note,hourofday,stop\n1,14,"multi\nline",5,-2\n2,15,"x,y",6,-3\n',
+    "bt2___s_d": "rank,traderid,limit,hourofday,stop\n1,16,40,9,-1\n",
+    "bt3___s_e": "",
+}
+
+# A row with a missing field can't go through the combined Arrow parse
+RAGGED_FILES = {
+    **CLEAN_FILES,
+    "bt3___s_f": ",rank,traderid,dayofweek,hourofday,stop\n0,1,17,1,5,-2\n1,2,18,2,6\n",
+}
+
+
+def _write_tree(files):
+    for scenario, content in files.items():
+        directory = os.path.join("output", SYMBOL_DIR, "trades", scenario, "trades")
+        os.makedirs(directory)
+        with open(os.path.join(directory, f"filtered-{scenario}.csv"), "w", newline="") as f:
+            f.write(content)
+
+
+def _read_each_file_with_pandas():
+    """The reference result: every file read on its own with pd.read_csv, then concatenated."""
+    dfs = []
+    for file_path in sorted(glob.glob(os.path.join("output", "*", "trades", "*", "trades", "filtered-*.csv"))):
+        path_parts = file_path.split(os.path.sep)
+        try:
+            df = pd.read_csv(file_path)
+        except pd.errors.EmptyDataError:
+            continue
+        df.insert(0, 'scenario', path_parts[3])
+        df['Symbol'] = path_parts[1].split("_")[0]
+        dfs.append(df)
+    combined_df = pd.concat(dfs, ignore_index=True)
+    return combined_df.drop(columns=[col for col in combined_df.columns if col.startswith('Unnamed: 0')])
+
+
+def _as_csv(df, columns):
+    """Compare frames as the CSV text they are written as, independent of file discovery order."""
+    return df[columns].sort_values(['scenario', 'traderid']).to_csv(index=False)
+
+
+@pytest.mark.parametrize("files", [CLEAN_FILES, RAGGED_FILES], ids=["clean", "ragged"])
+def test_matches_per_file_read_csv(tmp_path, monkeypatch, files):
+    monkeypatch.chdir(tmp_path)
+    _write_tree(files)
+
+    combined_df = aggregate_filtered_setup_files()
+    expected_df = _read_each_file_with_pandas()
+
+    assert combined_df.columns[:2].tolist() == ['scenario', 'rank']
+    assert not any(col.startswith('Unnamed: 0') for col in combined_df.columns)
+    assert sorted(combined_df.columns) == sorted(expected_df.columns)
+    columns = combined_df.columns.tolist()
+    assert _as_csv(combined_df, columns) == _as_csv(expected_df, columns)
+
+
+def test_writes_output_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_tree(CLEAN_FILES)
+
+    combined_df = aggregate_filtered_setup_files(str(tmp_path / "combined.csv"))
+
+    assert len(pd.read_csv(tmp_path / "combined.csv")) == len(combined_df) == 7
@@ -0,0 +1,104 @@
+# test_download_and_unzip_all_trades.py
+import hashlib
+import io
+import os
+import types
+import zipfile
+
+from botocore.hooks import HierarchicalEmitter
+
+from extractor import ARCHIVE_MARKER, download_and_unzip_all_trades
+
+BUCKET = "trades-bucket"
+SYMBOL = "btc-1mF"
+
+
+class InMemoryS3:
+    """Just enough of a boto3 S3 client (listing and GetObject) for the extractor's transfer manager."""
+
+    def __init__(self):
+        self.objects = {}
+        self.downloaded_keys = []
+        self.meta = types.SimpleNamespace(events=HierarchicalEmitter(), region_name="eu-central-1")
+
+    def get_paginator(self, operation_name):
+        assert operation_name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix="", Delimiter=None):
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        if Delimiter:
+            prefixes = sorted({key[:key.index(Delimiter) + 1] for key in keys if Delimiter in key})
+            yield {"CommonPrefixes": [{"Prefix": prefix} for prefix in prefixes]}
+            return
+        yield {"Contents": [{"Key": key, "Size": len(self.objects[key]),
+                             "ETag": f'"{hashlib.md5(self.objects[key]).hexdigest()}"'} for key in keys]}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.downloaded_keys.append(Key)
+        return {"Body": io.BytesIO(self.objects[Key]), "ContentLength": len(self.objects[Key])}
+
+
+def _zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return buffer.getvalue()
+
+
+def _sync(s3_client, output_dir):
+    s3_client.downloaded_keys.clear()
+    download_and_unzip_all_trades(SYMBOL, str(output_dir), BUCKET, s3_client)
+    return sorted(s3_client.downloaded_keys)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_incremental_sync(tmp_path):
+    s3_client = InMemoryS3()
+    key_a = f"bt-a/{SYMBOL}/s_1..2.zip"
+    key_b = f"bt-b/{SYMBOL}/s_3..4.zip"
+    s3_client.objects[key_a] = _zip({"trades/filtered-a.csv": "traderid\n1\n"})
+    s3_client.objects[key_b] = _zip({"trades/filtered-b.csv": "traderid\n2\n"})
+    s3_client.objects[f"bt-a/eth-1mF/s_9..9.zip"] = _zip({"other.csv": "x\n"})
+    scenario_a = tmp_path / "trades" / "bt-a___s_1..2"
+    scenario_b = tmp_path / "trades" / "bt-b___s_3..4"
+
+    # First run extracts every archive for the symbol and records its version
+    assert _sync(s3_client, tmp_path) == [key_a, key_b]
+    assert _read(scenario_a / "trades" / "filtered-a.csv") == "traderid\n1\n"
+    assert _read(scenario_b / "trades" / "filtered-b.csv") == "traderid\n2\n"
+    assert os.path.exists(scenario_a / ARCHIVE_MARKER)
+    assert sorted(os.listdir(tmp_path / "trades")) == ["bt-a___s_1..2", "bt-b___s_3..4"]
+
+    # Unchanged archives are skipped and their folders left exactly as they are
+    (scenario_a / "kept.txt").write_text("untouched")
+    assert _sync(s3_client, tmp_path) == []
+    assert _read(scenario_a / "kept.txt") == "untouched"
+
+    # A changed archive (new ETag/size) is downloaded again and replaces its folder's contents
+    s3_client.objects[key_b] = _zip({"trades/filtered-b2.csv": "traderid\n3\n"})
+    assert _sync(s3_client, tmp_path) == [key_b]
+    assert sorted(os.listdir(scenario_b / "trades")) == ["filtered-b2.csv"]
+    assert _read(scenario_a / "kept.txt") == "untouched"
+
+    # An archive deleted from S3 has its scenario folder removed
+    del s3_client.objects[key_a]
+    assert _sync(s3_client, tmp_path) == []
+    assert sorted(os.listdir(tmp_path / "trades")) == ["bt-b___s_3..4"]
+
+
+def test_interrupted_unzip_is_retried(tmp_path):
+    s3_client = InMemoryS3()
+    key = f"bt-a/{SYMBOL}/s_1..2.zip"
+    s3_client.objects[key] = _zip({"trades/filtered-a.csv": "traderid\n1\n"})
+    _sync(s3_client, tmp_path)
+
+    # Without a marker (e.g. the previous unzip was interrupted) the archive is extracted again
+    os.remove(tmp_path / "trades" / "bt-a___s_1..2" / ARCHIVE_MARKER)
+    assert _sync(s3_client, tmp_path) == [key]
+    assert os.path.exists(tmp_path / "trades" / "bt-a___s_1..2" / ARCHIVE_MARKER)